@@ -9,13 +9,75 @@ License: BSD-3C
 """
 
 #
+import collections
+import copy
+import functools
+import math
+import warnings
+from collections.abc import Hashable
+
 import numpy as np
-from scipy import optimize
 from scipy.integrate import ode
 
 from . import constants as constants
 from .saturation_vapor_pressures import es_default
 
+# smallest positive float, used to floor the arguments of logarithms whose prefactors vanish
+_tiny = np.finfo(float).tiny
+
+
+def _memoize_scalars(func, maxsize=256):
+    """Decorator that caches the results of calls with scalar arguments
+
+    Some functions, such as plcl, are expensive as they require the iterative solution of
+    implicit equations, but are often called repeatedly with the same arguments when working
+    on parcels.  Calls whose arguments are all hashable (scalars and functions) are looked up
+    in a least-recently-used cache.  Results containing nan, as returned by solutions that
+    failed, are not cached, so that repeating the call repeats its warning.  Calls with array
+    arguments are passed through.
+
+    Args:
+        func: function to memoize
+        maxsize: number of results that are kept
+
+    Returns:
+        the memoized function, with a cache_clear method to empty the cache
+    """
+    cache = collections.OrderedDict()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not all(isinstance(x, Hashable) for x in (*args, *kwargs.values())):
+            return func(*args, **kwargs)
+
+        key = (args, tuple(sorted(kwargs.items())))
+        if key in cache:
+            cache.move_to_end(key)
+            return copy.copy(cache[key])
+
+        result = func(*args, **kwargs)
+        if not np.any(np.isnan(result)):
+            cache[key] = result
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+        return copy.copy(result)
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+def _all_scalars(*args):
+    """Returns True if all arguments are python ints or floats
+
+    Used to dispatch single values to implementations based on the math module, whose
+    functions are much cheaper than numpy's for scalars.  Of the numpy scalars only float64,
+    which subclasses float, qualifies; others such as float32 or int64 take the numpy path.
+    """
+    for x in args:
+        if not isinstance(x, (int, float)):
+            return False
+    return True
+
 
 def make_es_mxd(es_liq, es_ice):
     """Closure to construct a mixed form of the saturation vapor pressure
@@ -34,6 +96,9 @@ def make_es_mxd(es_liq, es_ice):
     """
 
     def es(T):
+        # python floats are compared without numpy
+        if isinstance(T, (int, float)):
+            return min(es_liq(T), es_ice(T))
         return np.minimum(es_liq(T), es_ice(T))
 
     return es
@@ -64,6 +129,17 @@ def make_static_energy(hv0):
 
     """
 
+    cpd = constants.cpd
+    g = constants.gravity_earth
+
+    # specific heats and reference enthalpies of each water phase relative to dry air
+    delta_cv = constants.cpv - cpd
+    delta_cl = constants.cl - cpd
+    delta_ci = constants.ci - cpd
+    hv = hv0 - constants.cpv * constants.T0
+    hl = hv0 - constants.lv0 - constants.cl * constants.T0
+    hi = hv0 - constants.ls0 - constants.ci * constants.T0
+
     def h(T, Z, qv=0, ql=0, qi=0):
         """Returns moist static energies given the closure
 
@@ -78,17 +154,13 @@ def make_static_energy(hv0):
             qi: specific ice mass
         """
 
-        qt = qv + ql + qi
-        x = (
-            T * (1.0 - qt) * constants.cpd
-            + hv0 * qt
-            + (T - constants.T0)
-            * (qv * constants.cpv + ql * constants.cl + qi * constants.ci)
-            - ql * constants.lv0
-            - qi * constants.ls0
-            + constants.gravity_earth * Z
+        return (
+            T * cpd
+            + g * Z
+            + qv * (T * delta_cv + hv)
+            + ql * (T * delta_cl + hl)
+            + qi * (T * delta_ci + hi)
         )
-        return x
 
     return h
 
@@ -96,6 +168,9 @@ def make_static_energy(hv0):
 def planck(T, nu):
     """Planck source function (J/m2 per steradian per Hz)
 
+    The function broadcasts over its arguments, so that the radiances for a set of temperatures
+    and a grid of frequencies are obtained from planck(T[:, np.newaxis], nu).
+
     Args:
         T: temperature in kelvin
         nu: frequency in Hz
@@ -105,12 +180,12 @@ def planck(T, nu):
         multiply by $\pi$ to convert to irradiances
 
     >>> planck(300,1000*constants.c)
-    8.086837160291128e-15
+    8.086837160291124e-15
     """
     c = constants.speed_of_light
     h = constants.planck_constant
     kB = constants.boltzmann_constant
-    return (2 * h * nu**3 / c**2) / (np.exp(h * nu / (kB * T)) - 1)
+    return (2 * h / c**2) * nu * nu * nu / np.expm1((h / kB) * nu / T)
 
 
 def vaporization_enthalpy(T, delta_cl=constants.delta_cl):
@@ -193,7 +268,7 @@ def partial_pressure_to_specific_humidity(pp, p):
     return r / (1 + r)
 
 
-def saturation_partition(P, ps, qt):
+def saturation_partition(P, ps, qt, out=None):
     """Returns the water vapor specific humidity given saturation vapor presure
 
     When condensate is present the saturation specific humidity and the total
@@ -201,9 +276,15 @@ def saturation_partition(P, ps, qt):
     calculating the former from the saturation mixing ratio.  In subsaturated air
     the vapor speecific humidity is just the total specific humidity
 
+    Args:
+        P: pressure in pascal
+        ps: saturation vapor pressure in pascal
+        qt: total water specific humidity (unitless)
+        out: optional array in which to place the result, avoiding its allocation
     """
-    qs = partial_pressure_to_mixing_ratio(ps, P) * (1.0 - qt)
-    return np.minimum(qt, qs)
+    eps1 = constants.rd_over_rv
+    qs = eps1 * ps / (P - ps) * (1.0 - qt)
+    return np.minimum(qt, qs, out=out)
 
 
 def theta(T, P, qv=0.0, ql=0.0, qi=0.0):
@@ -267,7 +348,7 @@ def theta_e_bolton(T, P, qt, es=es_default):
     )
 
 
-def theta_e(T, P, qt, es=es_default):
+def theta_e(T, P, qt, es=es_default, out=None):
     """Returns the equivalent potential temperature
 
     Follows Eq. 11 in Marquet and Stevens (2022). The closed form solutionis derived for a
@@ -280,6 +361,7 @@ def theta_e(T, P, qt, es=es_default):
         P: pressure in pascal
         qt: total water specific humidity (unitless)
         es: form of the saturation vapor pressure
+        out: optional array in which to place the result
 
     Reference:
         Marquet, P. & Stevens, B. On Moist Potential Temperatures and Their Ability to
@@ -293,6 +375,9 @@ def theta_e(T, P, qt, es=es_default):
     cl = constants.liquid_water_specific_heat
     lv = vaporization_enthalpy
 
+    if out is None and _all_scalars(T, P, qt):
+        return _theta_e_scalar(T, P, qt, es)
+
     ps = es(T)
     qv = saturation_partition(P, ps, qt)
 
@@ -301,12 +386,47 @@ def theta_e(T, P, qt, es=es_default):
     pv = qv * (Rv / R) * P
     RH = pv / ps
     cpe = cpd + qt * (cl - cpd)
-    omega_e = RH ** (-qv * Rv / cpe) * (R / Re) ** (Re / cpe)
-    theta_e = T * (P0 / P) ** (Re / cpe) * omega_e * np.exp(qv * lv(T) / (cpe * T))
+    x = (
+        (Re / cpe) * np.log(R * P0 / (Re * P))
+        - (Rv / cpe) * qv * np.log(np.maximum(RH, _tiny))
+        + qv * lv(T) / (cpe * T)
+    )
+    theta_e = np.multiply(T, np.exp(x), out=out)
     return theta_e
 
 
-def theta_l(T, P, qt, es=es_default):
+def _theta_e_scalar(T, P, qt, es):
+    """Returns the equivalent potential temperature for scalar arguments
+
+    Evaluates the same expression as theta_e using the math module, which for single values is
+    several times faster than dispatching to numpy.  States outside of the domain of the math
+    functions (P <= ps, or qt outside of [0, 1)) are passed to the numpy expression, which
+    returns nan or its limiting value for them.  See theta_e
+    """
+    P0 = constants.standard_pressure
+    Rd = constants.dry_air_gas_constant
+    Rv = constants.water_vapor_gas_constant
+    cpd = constants.isobaric_dry_air_specific_heat
+    cl = constants.liquid_water_specific_heat
+    eps1 = constants.rd_over_rv
+    lv = vaporization_enthalpy
+
+    ps = es(T) if T > 0.0 else math.nan
+    if not (P > ps and 0.0 <= qt < 1.0):
+        return float(theta_e(np.asarray(T), P, qt, es=es))
+    qv = min(qt, eps1 * ps / (P - ps) * (1.0 - qt))
+
+    Re = (1.0 - qt) * Rd
+    R = Re + qv * Rv
+    cpe = cpd + qt * (cl - cpd)
+    x = (Re / cpe) * math.log(R * P0 / (Re * P)) + qv * lv(T) / (cpe * T)
+    if qv > 0.0:
+        RH = qv * (Rv / R) * P / ps
+        x -= (Rv / cpe) * qv * math.log(RH)
+    return T * math.exp(x)
+
+
+def theta_l(T, P, qt, es=es_default, out=None):
     """Returns the liquid-water potential temperature
 
     Follows Eq. 16 in Marquet and Stevens (2022). The closed form solutionis derived for a
@@ -319,12 +439,27 @@ def theta_l(T, P, qt, es=es_default):
         P: pressure in pascal
         qt: total water specific humidity (unitless)
         es: form of the saturation vapor pressure
+        out: optional array in which to place the result
 
     Reference:
         Marquet, P. & Stevens, B. On Moist Potential Temperatures and Their Ability to
         Characterize Differences in the Properties of Air Parcels. Journal of the Atmospheric
         Sciences 79, 1089–1103 (2022).
     """
+    if out is None and _all_scalars(T, P, qt):
+        return _theta_l_scalar(T, P, qt, es)
+
+    qv = saturation_partition(P, es(T), qt)
+    return _theta_l_core(T, P, qt, qv, out=out)
+
+
+def _theta_l_core(T, P, qt, qv, out=None):
+    """Returns the liquid-water potential temperature given the vapor specific humidity
+
+    Evaluates the expression for theta_l once the saturation partition of qt into vapor has
+    been determined, so that callers that also need qv only evaluate the saturation vapor
+    pressure once.  See theta_l
+    """
     P0 = constants.standard_pressure
     Rd = constants.dry_air_gas_constant
     Rv = constants.water_vapor_gas_constant
@@ -332,20 +467,55 @@ def theta_l(T, P, qt, es=es_default):
     cpv = constants.isobaric_water_vapor_specific_heat
     lv = vaporization_enthalpy
 
-    ps = es(T)
-    qv = saturation_partition(P, ps, qt)
     ql = qt - qv
 
     R = Rd * (1 - qt) + qv * Rv
     Rl = Rd + qt * (Rv - Rd)
     cpl = cpd + qt * (cpv - cpd)
 
-    omega_l = (R / Rl) ** (Rl / cpl) * (qt / (qv + 1.0e-15)) ** (qt * Rv / cpl)
-    theta_l = (T * (P0 / P) ** (Rl / cpl)) * omega_l * np.exp(-ql * lv(T) / (cpl * T))
+    # the factor (qt/qv)**(qt*Rv/cpl) is written in terms of ql so that it is exactly unity for
+    # unsaturated (ql = 0) and dry (qt = 0) air
+    x = (
+        (Rl / cpl) * np.log(R * P0 / (Rl * P))
+        - (Rv / cpl) * qt * np.log1p(-ql / np.maximum(qt, _tiny))
+        - ql * lv(T) / (cpl * T)
+    )
+    theta_l = np.multiply(T, np.exp(x), out=out)
     return theta_l
 
 
-def theta_s(T, P, qt, es=es_default):
+def _theta_l_scalar(T, P, qt, es):
+    """Returns the liquid-water potential temperature for scalar arguments
+
+    Evaluates the same expression as theta_l using the math module, which for single values is
+    several times faster than dispatching to numpy.  States outside of the domain of the math
+    functions (P <= ps, or qt outside of [0, 1)) are passed to the numpy expression.  See theta_l
+    """
+    P0 = constants.standard_pressure
+    Rd = constants.dry_air_gas_constant
+    Rv = constants.water_vapor_gas_constant
+    cpd = constants.isobaric_dry_air_specific_heat
+    cpv = constants.isobaric_water_vapor_specific_heat
+    eps1 = constants.rd_over_rv
+    lv = vaporization_enthalpy
+
+    ps = es(T) if T > 0.0 else math.nan
+    if not (P > ps and 0.0 <= qt < 1.0):
+        return float(theta_l(np.asarray(T), P, qt, es=es))
+    qv = min(qt, eps1 * ps / (P - ps) * (1.0 - qt))
+    ql = qt - qv
+
+    R = Rd * (1 - qt) + qv * Rv
+    Rl = Rd + qt * (Rv - Rd)
+    cpl = cpd + qt * (cpv - cpd)
+
+    x = (Rl / cpl) * math.log(R * P0 / (Rl * P)) - ql * lv(T) / (cpl * T)
+    if ql > 0.0:
+        x -= (Rv / cpl) * qt * math.log1p(-ql / qt)
+    return T * math.exp(x)
+
+
+def theta_s(T, P, qt, es=es_default, out=None):
     """Returns the entropy potential temperature
 
     Follows Eq. 18 in Marquet and Stevens (2022). The closed form solutionis derived for a
@@ -358,6 +528,7 @@ def theta_s(T, P, qt, es=es_default):
         P: pressure in pascal
         qt: total water specific humidity (unitless)
         es: form of the saturation vapor pressure
+        out: optional array in which to place the result
 
     Reference:
         Marquet, P. & Stevens, B. On Moist Potential Temperatures and Their Ability to
@@ -397,26 +568,23 @@ def theta_s(T, P, qt, es=es_default):
     RH = pv / ps
     rv = qv / (1 - qv)
 
-    x1 = (
-        (T / T0) ** (lmbd * qt)
-        * (P0 / P) ** (kappa * delta * qt)
-        * (rv / r0) ** (-gamma * qt)
-        * RH ** (gamma * ql)
-    )
-    x2 = (1.0 + eta * rv) ** (kappa * (1.0 + delta * qt)) * (1.0 + eta * r0) ** (
-        -kappa * delta * qt
-    )
-    theta_s = (
-        (T * (P0 / P) ** (kappa))
-        * np.exp(-ql * lv(T) / (cpd * T))
-        * np.exp(qt * Lmbd)
-        * x1
-        * x2
+    # the product of powers in Eq. 18 is evaluated as a single exponential of the sum of
+    # their logarithms, flooring their arguments keeps factors with vanishing exponents unity
+    x = (
+        -kappa * (1.0 + delta * qt) * np.log(P / P0)
+        + lmbd * qt * np.log(T / T0)
+        - gamma * qt * np.log(np.maximum(rv / r0, _tiny))
+        + gamma * ql * np.log(np.maximum(RH, _tiny))
+        + kappa * (1.0 + delta * qt) * np.log1p(eta * rv)
+        - kappa * delta * qt * np.log1p(eta * r0)
+        - ql * lv(T) / (cpd * T)
+        + qt * Lmbd
     )
+    theta_s = np.multiply(T, np.exp(x), out=out)
     return theta_s
 
 
-def theta_es(T, P, es=es_default):
+def theta_es(T, P, es=es_default, out=None):
     """Returns the saturated equivalent potential temperature
 
     Adapted from Eq. 11 in Marquet and Stevens (2022) with the assumption that the gas quanta is
@@ -427,6 +595,7 @@ def theta_es(T, P, es=es_default):
         P: pressure in pascal
         qt: total water specific humidity (unitless)
         es: form of the saturation vapor pressure
+        out: optional array in which to place the result
 
     Reference:
         Characterize Differences in the Properties of Air Parcels. Journal of the Atmospheric
@@ -440,18 +609,48 @@ def theta_es(T, P, es=es_default):
     p2q = partial_pressure_to_specific_humidity
     lv = vaporization_enthalpy
 
+    if out is None and _all_scalars(T, P):
+        return _theta_es_scalar(T, P, es)
+
     ps = es(T)
     qs = p2q(ps, P)
 
     Re = (1.0 - qs) * Rd
     R = Re + qs * Rv
     cpe = cpd + qs * (cl - cpd)
-    omega_e = (R / Re) ** (Re / cpe)
-    theta_es = T * (P0 / P) ** (Re / cpe) * omega_e * np.exp(qs * lv(T) / (cpe * T))
+    x = (Re / cpe) * np.log(R * P0 / (Re * P)) + qs * lv(T) / (cpe * T)
+    theta_es = np.multiply(T, np.exp(x), out=out)
     return theta_es
 
 
-def theta_rho(T, P, qt, es=es_default):
+def _theta_es_scalar(T, P, es):
+    """Returns the saturated equivalent potential temperature for scalar arguments
+
+    Evaluates the same expression as theta_es using the math module, which for single values is
+    several times faster than dispatching to numpy.  States outside of the domain of the math
+    functions (P <= ps) are passed to the numpy expression.  See theta_es
+    """
+    P0 = constants.standard_pressure
+    Rd = constants.dry_air_gas_constant
+    Rv = constants.water_vapor_gas_constant
+    cpd = constants.isobaric_dry_air_specific_heat
+    cl = constants.liquid_water_specific_heat
+    p2q = partial_pressure_to_specific_humidity
+    lv = vaporization_enthalpy
+
+    ps = es(T) if T > 0.0 else math.nan
+    if not P > ps:
+        return float(theta_es(np.asarray(T), P, es=es))
+    qs = p2q(ps, P)
+
+    Re = (1.0 - qs) * Rd
+    R = Re + qs * Rv
+    cpe = cpd + qs * (cl - cpd)
+    x = (Re / cpe) * math.log(R * P0 / (Re * P)) + qs * lv(T) / (cpe * T)
+    return T * math.exp(x)
+
+
+def theta_rho(T, P, qt, es=es_default, out=None):
     """Returns the density liquid-water potential temperature
 
     calculates $\theta_\mathrm{l} R/R_\mathrm{d}$ where $R$ is the gas constant of a
@@ -463,23 +662,119 @@ def theta_rho(T, P, qt, es=es_default):
         P: pressure in pascal
         qt: total water specific humidity (unitless)
         es: form of the saturation vapor pressure
+        out: optional array in which to place the result
     """
     Rd = constants.dry_air_gas_constant
     Rv = constants.water_vapor_gas_constant
 
-    ps = es(T)
-    qv = saturation_partition(P, ps, qt)
-    theta_rho = theta_l(T, P, qt, es) * (1.0 - qt + qv * Rv / Rd)
+    qv = saturation_partition(P, es(T), qt)
+    theta_rho = _theta_l_core(T, P, qt, qv, out=out)
+    theta_rho *= 1.0 - qt + qv * Rv / Rd
     return theta_rho
 
 
+def _newton(zero, x0, dx, tol, max_step, maxiter=30, stacklevel=3):
+    """Returns the root of zero(x) from safeguarded Newton-Raphson iterations
+
+    The derivative is estimated by a forward difference, so that each iteration requires
+    two evaluations of zero.  The iteration is expressed through array operations, so that
+    zero is evaluated for all elements at once, and stops once the steps of all elements
+    are smaller than tol; elements whose step is smaller than tol are no longer changed.
+    Because the thermodynamic functions have a kink at saturation, plain Newton steps can
+    jump back and forth across the root indefinitely.  Steps are therefore limited to
+    max_step, and once iterates on both sides of the root are known, steps that leave this
+    bracket or fail to at least halve are replaced by bisection.
+    Iterates at which zero is not defined (nan) are moved halfway back to the last iterate
+    at which it was.  Elements that have not converged after maxiter iterations are set to
+    nan, with a warning.
+
+    Args:
+        zero: residual function of x, broadcasting over arrays
+        x0: first guess, whose shape sets the shape of the result
+        dx: increment used to estimate the derivative
+        tol: absolute tolerance in x at which to stop iterating
+        max_step: largest change of x in a single iteration
+        maxiter: maximum number of iterations
+        stacklevel: stack level of the warning, the default pointing to the caller of the
+            function that calls _newton
+    """
+    x = np.array(x0, dtype=float)
+    x_valid = np.full(x.shape, np.nan)  # last iterate with a defined residual
+    x_neg = np.full(x.shape, np.nan)  # last iterate with a negative residual
+    x_pos = np.full(x.shape, np.nan)  # last iterate with a positive residual
+    step = np.full(x.shape, np.inf)
+    converged = np.zeros(x.shape, dtype=bool)
+
+    with np.errstate(all="ignore"):
+        for _ in range(maxiter):
+            # scalars are passed on as floats, so that zero can use its scalar path
+            z = np.asarray(zero(x[()]))
+            dz = np.asarray(zero((x + dx)[()])) - z
+            x_valid = np.where(np.isnan(z), x_valid, x)
+            x_neg = np.where(z < 0.0, x, x_neg)
+            x_pos = np.where(z > 0.0, x, x_pos)
+
+            x_new = x - np.maximum(np.minimum(z * dx / dz, max_step), -max_step)
+            lo = np.minimum(x_neg, x_pos)
+            hi = np.maximum(x_neg, x_pos)
+            bisect = (lo < hi) & ~(
+                (x_new >= lo)
+                & (x_new <= hi)
+                & (np.abs(x_new - x) <= 0.5 * np.abs(step))
+            )
+            x_new = np.where(bisect, 0.5 * (lo + hi), x_new)
+            x_new = np.where(np.isnan(z), 0.5 * (x + x_valid), x_new)
+
+            # elements that have converged are no longer changed
+            step = np.where(converged, step, x_new - x)
+            x = np.where(converged, x, x_new)
+            converged = np.abs(step) < tol
+            if converged.all():
+                break
+
+    if not converged.all():
+        failed = ~converged
+        warnings.warn(
+            f"root not found for {np.count_nonzero(failed)} of {failed.size} "
+            "states, which are set to nan",
+            RuntimeWarning,
+            stacklevel=stacklevel,
+        )
+        x[failed] = np.nan
+    return float(x) if x.ndim == 0 else x
+
+
+def _secant(zero, x0, x1, n_iter=8):
+    """Returns the root of zero(x) from a fixed number of secant iterations
+
+    Like _newton, but with a fixed number of iterations and for a residual function that
+    is expensive to evaluate, as it is only evaluated once per iteration.  Elements which
+    have converged, and hence whose residual no longer changes, are left unchanged.
+
+    Args:
+        zero: residual function of x, broadcasting over arrays
+        x0: first guess
+        x1: second guess, ideally closer to the root than x0
+        n_iter: number of iterations
+    """
+    x0, x1 = np.broadcast_arrays(np.asarray(x0, dtype=float), x1)
+    z0 = zero(x0)
+    for _ in range(n_iter):
+        z1 = zero(x1)
+        dz = z1 - z0
+        step = np.divide(z1 * (x1 - x0), dz, out=np.zeros(dz.shape), where=dz != 0)
+        x0, z0 = x1, z1
+        x1 = x1 - step
+    return x1[()]
+
+
+@_memoize_scalars
 def invert_for_temperature(f, f_val, P, qt, es=es_default):
     """Returns temperature for an atmosphere whose state is given by f, P and qt
 
         Infers the temperature from a state description (f,P,qt), where
-        f(T,P,qt) = fval.  Uses a newton raphson method. This function only
-        works on scalar quantities due to the state dependent number of iterations
-        needed for convergence
+        f(T,P,qt) = fval.  Uses a newton raphson method, which works equally on
+        scalars and on arrays of states.
 
     Args:
             f(T,P,qt): specified thermodynamice function, i.e., theta_l
@@ -492,21 +787,21 @@ def invert_for_temperature(f, f_val, P, qt, es=es_default):
             304.49714304228814
     """
 
-    def zero(T, f_val):
-        return f_val - f(T, P, qt, es=es)
+    def zero(T):
+        return f(T, P, qt, es=es) - f_val
 
-    x0 = np.full_like(f_val, 280)
+    x0 = np.full(np.broadcast(f_val, P, qt).shape, 280.0)
 
-    return optimize.newton(zero, x0, args=(f_val,))
+    # the memoizing wrapper adds a frame between this function and its caller
+    return _newton(zero, x0, dx=1.0e-3, tol=1.0e-9, max_step=10.0, stacklevel=4)
 
 
 def invert_for_pressure(f, f_val, T, qt, es=es_default):
     """Returns pressure for an atmosphere whose state is given by f, T and qt
 
         Infers the pressure from a state description (f,T,qt), where
-        f(T,P,qt) = fval.  Uses a newton raphson method.  This function only
-        works on scalar quantities due to the state dependent number of iterations
-        needed for convergence.
+        f(T,P,qt) = fval.  Uses a newton raphson method, which works equally on
+        scalars and on arrays of states.
 
     Args:
             f(T,P,qt): specified thermodynamice funcint, i.e., theta_l
@@ -516,23 +811,25 @@ def invert_for_pressure(f, f_val, T, qt, es=es_default):
             es: form of the saturation vapor pressure, passed to f
 
             >>> invert_for_pressure(theta_e, 350.,300.,17.e-3)
-            94904.59555001547
+            94904.59555001551
     """
 
-    def zero(P, f_val):
-        return f_val - f(T, P, qt, es=es)
+    def zero(P):
+        return f(T, P, qt, es=es) - f_val
 
-    x0 = np.full_like(f_val, 80000.0)
+    x0 = np.full(np.broadcast(f_val, T, qt).shape, 80000.0)
 
-    return optimize.newton(zero, x0, args=(f_val,))
+    return _newton(zero, x0, dx=1.0e-1, tol=1.0e-6, max_step=1.0e4)
 
 
+@_memoize_scalars
 def plcl(T, P, qt, es=es_default):
     """Returns the pressure at the lifting condensation level
 
     Calculates the lifting condensation level pressure using an interative solution under the
     constraint of constant theta-l. Exact to within the accuracy of the expression of theta-l
-    which depends on the expression for the saturation vapor pressure
+    which depends on the expression for the saturation vapor pressure.  The iteration is
+    started from the estimate of plcl_bolton and works equally on arrays of parcels.
 
     Args:
         T: temperature in kelvin
@@ -543,16 +840,24 @@ def plcl(T, P, qt, es=es_default):
         array([95994.43612848])
     """
 
-    def zero(P, Tl):
-        p2r = partial_pressure_to_mixing_ratio
-        T = invert_for_temperature(theta_l, Tl, P, qt, es=es)
-        qs = p2r(es(T), P) * (1.0 - qt)
-        return np.abs(qs / qt - 1.0)
+    P0 = constants.standard_pressure
+    Rd = constants.dry_air_gas_constant
+    Rv = constants.water_vapor_gas_constant
+    cpd = constants.isobaric_dry_air_specific_heat
+    cpv = constants.isobaric_water_vapor_specific_heat
+    p2r = partial_pressure_to_mixing_ratio
 
+    Rl = Rd + qt * (Rv - Rd)
+    cpl = cpd + qt * (cpv - cpd)
     Tl = theta_l(T, P, qt, es=es)
-    x0 = np.full_like(Tl, 80000.0)
 
-    return optimize.fsolve(zero, x0, args=(Tl,))
+    # at and below the LCL the parcel is unsaturated, so that theta-l reduces to a potential
+    # temperature from which the temperature along the isentrope follows in closed form
+    def zero(P):
+        T = Tl * (P / P0) ** (Rl / cpl)
+        return p2r(es(T), P) * (1.0 - qt) / qt - 1.0
+
+    return np.atleast_1d(_secant(zero, P, plcl_bolton(T, P, qt)))
 
 
 def plcl_bolton(T, P, qt):
@@ -652,17 +957,21 @@ def moist_adiabat(
         Pend: pressure to which to integrate to in pascal
         dP:   integration step
         qt:   specific mass of total water
+        cc:   specific heat of the condensate
+        lv:   phase change enthalpy of the condensate
         es:   saturation vapor expression
 
     """
 
-    def f(P, T, qt, cc, lv):
-        Rd = constants.Rd
-        Rv = constants.Rv
-        cpd = constants.cpd
-        cpv = constants.cpv
+    Rd = constants.Rd
+    Rv = constants.Rv
+    cpd = constants.cpd
+    cpv = constants.cpv
+    eps1 = constants.rd_over_rv
 
-        qv = saturation_partition(P, es(T), qt)
+    def f(P, T):
+        ps = es(T)
+        qv = min(qt, eps1 * ps / (P - ps) * (1.0 - qt))
         qc = qt - qv
         qd = 1.0 - qt
 
@@ -673,23 +982,28 @@ def moist_adiabat(
         dX_dT = cp
         dX_dP = vol
         if qc > 0.0:
+            lv_T = lv(T)
             beta_P = R / (qd * Rd)
-            beta_T = beta_P * lv(T) / (Rv * T)
+            beta_T = beta_P * lv_T / (Rv * T)
 
-            dX_dT += lv(T) * qv * beta_T / T
-            dX_dP *= 1.0 + lv(T) * qv * beta_P / (R * T)
+            dX_dT += lv_T * qv * beta_T / T
+            dX_dP *= 1.0 + lv_T * qv * beta_P / (R * T)
         return dX_dP / dX_dT
 
-    Tx = []
-    Px = []
-    r = ode(f).set_integrator("lsoda", atol=0.0001)
-    r.set_initial_value(Tbeg, Pbeg).set_f_params(qt, cc, lv)
-    while r.successful() and r.t > Pend:
+    # one more than the number of steps, in case round-off adds a step
+    n = max(int(np.ceil((Pbeg - Pend) / abs(dP))) + 1, 0)
+    Tx = np.empty(n)
+    Px = np.empty(n)
+    i = 0
+    r = ode(lambda P, T: f(P, float(T[0]))).set_integrator("lsoda", atol=0.0001)
+    r.set_initial_value(Tbeg, Pbeg)
+    while r.successful() and r.t > Pend and i < n:
         r.integrate(r.t + dP)
-        Tx.append(r.y[0])
-        Px.append(r.t)
+        Tx[i] = r.y[0]
+        Px[i] = r.t
+        i += 1
 
-    return np.asarray(Tx), np.asarray(Px)
+    return Tx[:i], Px[:i]
 
 
 moist_static_energy = make_static_energy(
@@ -1,6 +1,7 @@
 import pytest
 import numpy as np
 
+from moist_thermodynamics import constants
 from moist_thermodynamics import functions as mtf
 from moist_thermodynamics.saturation_vapor_pressures import es_default
 
@@ -21,7 +22,7 @@ def test_invert_T(T, p, qt):
     Tl = mtf.theta_l(T, p, qt, es=es)
     temp = mtf.invert_for_temperature(mtf.theta_l, Tl, p, qt, es=es)
 
-    np.testing.assert_array_equal(temp, T)
+    np.testing.assert_allclose(temp, T, rtol=0, atol=1.0e-9)
 
 
 @pytest.mark.parametrize("T, p, qt", data)
@@ -31,3 +32,199 @@ def test_plcl(T, p, qt):
         print(res)
         assert np.all(res[:-1] - res[1:] < 0)
         assert abs(res[-1] - 95994.43612848) < 1
+
+
+def test_plcl_array():
+    # includes a very dry parcel, whose LCL is near 52 kPa
+    T = np.array([300.0, 285.0, 300.0, 210.0])
+    p = np.array([100000.0, 80000.0, 102000.0, 20000.0])
+    qt = np.array([1.0e-3, 6.6e-3, 17.0e-3, 0.2e-3])
+    res = mtf.plcl(T, p, qt)
+
+    for i in range(T.size):
+        np.testing.assert_allclose(res[i], mtf.plcl(T[i], p[i], qt[i]), rtol=1.0e-10)
+    assert abs(res[0] - 51675.135) < 1
+
+
+def test_plcl_memoized():
+    res = mtf.plcl(300.0, 100000.0, 17.0e-3)
+    res_again = mtf.plcl(300.0, 100000.0, 17.0e-3)
+
+    np.testing.assert_array_equal(res_again, res)
+    assert res_again is not res
+
+
+def test_memoize_scalars():
+    calls = []
+
+    @mtf._memoize_scalars
+    def f(x, y=1.0):
+        calls.append(x)
+        return x * y if np.all(x >= 0.0) else np.nan
+
+    f(4.0, y=2.0)
+    f(4.0, y=2.0)
+    assert len(calls) == 1
+
+    x = np.array([4.0, 9.0])
+    np.testing.assert_array_equal(f(x), f(x))
+    assert len(calls) == 3
+
+    # failed (nan) results are not cached
+    f(-1.0)
+    f(-1.0)
+    assert len(calls) == 5
+
+
+def test_invert_T_failed():
+    for _ in range(2):
+        with pytest.warns(RuntimeWarning, match="root not found") as record:
+            temp = mtf.invert_for_temperature(mtf.theta_l, np.nan, 80000.0, 10.0e-3)
+        assert np.isnan(temp)
+        assert record[0].filename == __file__
+
+
+def test_invert_T_broadcast():
+    T = np.array([280.0, 290.0, 300.0])
+    p = 90000.0
+    qt = 10.0e-3
+    Te = mtf.theta_e(T, p, qt, es=es)
+    temp = mtf.invert_for_temperature(mtf.theta_e, Te, p, qt, es=es)
+
+    np.testing.assert_allclose(temp, T, rtol=0, atol=1.0e-9)
+
+
+@pytest.mark.parametrize("f", [mtf.theta_l, mtf.theta_e, mtf.theta_s, mtf.theta_rho])
+def test_invert_saturated(f):
+    # saturated parcels put a kink into the residual, which has made
+    # undamped newton iterations cycle around the root
+    T, p = np.meshgrid(np.linspace(190.0, 320.0, 14), np.linspace(2.0e4, 1.0e5, 9))
+    qt = 1.2 * mtf.partial_pressure_to_specific_humidity(es(T), p)
+    x = f(T, p, qt, es=es)
+
+    temp = mtf.invert_for_temperature(f, x, p, qt, es=es)
+    np.testing.assert_allclose(temp, T, rtol=0, atol=1.0e-6)
+    pres = mtf.invert_for_pressure(f, x, T, qt, es=es)
+    np.testing.assert_allclose(pres, p, rtol=1.0e-9)
+
+    qs = mtf.partial_pressure_to_specific_humidity(es(300.0), 70000.0)
+    x = f(300.0, 70000.0, 1.2 * qs, es=es)
+    temp = mtf.invert_for_temperature(f, x, 70000.0, 1.2 * qs, es=es)
+    assert abs(temp - 300.0) < 1.0e-6
+
+
+def test_static_energy_broadcast():
+    T = np.array([300.0, 290.0])
+    qv = np.array([[10.0e-3], [20.0e-3]])
+    h = mtf.moist_static_energy(T, 0.0, qv)
+
+    assert h.shape == (2, 2)
+    for i in range(2):
+        for j in range(2):
+            assert h[i, j] == pytest.approx(
+                mtf.moist_static_energy(T[j], 0.0, qv[i, 0])
+            )
+
+
+def test_moist_adiabat_empty():
+    Tx, Px = mtf.moist_adiabat(300.0, 90000.0, 100000.0, -500.0, 17.0e-3)
+
+    assert Tx.size == 0 and Px.size == 0
+
+
+def test_es_mxd():
+    from moist_thermodynamics import saturation_vapor_pressures as svp
+
+    T = np.linspace(200.0, 320.0, 1001)
+    es_mxd = mtf.make_es_mxd(svp.liq_wagner_pruss, svp.ice_wagner_etal)
+    es_min = np.minimum(svp.liq_wagner_pruss(T), svp.ice_wagner_etal(T))
+
+    np.testing.assert_array_equal(es_mxd(T), es_min)
+
+    # the fits cross just above the triple point, where scalars must agree with arrays
+    TvT = constants.temperature_water_vapor_triple_point
+    assert es_mxd(TvT) == pytest.approx(es_mxd(np.array([TvT]))[0], rel=1.0e-14)
+    for f in (mtf.theta_e, mtf.theta_l):
+        x = f(TvT, 80000.0, 10.0e-3, es=es_mxd)
+        assert x == pytest.approx(
+            f(np.array([TvT]), 80000.0, 10.0e-3, es=es_mxd)[0], rel=1.0e-12
+        )
+
+
+scalar_states = [
+    [300.0, 100000.0, 17.0e-3],
+    [285.0, 80000.0, 6.6e-3],
+    [300.0, 70000.0, 40.0e-3],
+    [250.0, 50000.0, 0.0],
+    [400.0, 50000.0, 10.0e-3],
+    [300.0, 3000.0, 10.0e-3],
+    [300.0, 100000.0, 1.0],
+    [300.0, 100000.0, -10.0e-3],
+    [np.nan, 100000.0, 10.0e-3],
+]
+
+
+@pytest.mark.parametrize("f", [mtf.theta_e, mtf.theta_l])
+@pytest.mark.parametrize("T, p, qt", scalar_states)
+def test_scalar_path(f, T, p, qt):
+    with np.errstate(all="ignore"):
+        res = f(T, p, qt, es=es)
+        res_array = f(np.asarray([T]), np.asarray([p]), np.asarray([qt]), es=es)
+
+    assert isinstance(res, float)
+    np.testing.assert_allclose(res, res_array[0], rtol=1.0e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize("T, p", [state[:2] for state in scalar_states])
+def test_scalar_path_theta_es(T, p):
+    with np.errstate(all="ignore"):
+        res = mtf.theta_es(T, p, es=es)
+        res_array = mtf.theta_es(np.asarray([T]), np.asarray([p]), es=es)
+
+    assert isinstance(res, float)
+    np.testing.assert_allclose(res, res_array[0], rtol=1.0e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize(
+    "f", [mtf.theta_e, mtf.theta_l, mtf.theta_s, mtf.theta_es, mtf.theta_rho]
+)
+def test_out(f):
+    T = np.array([210.0, 285.0, 300.0, 300.0])
+    p = np.array([20000.0, 80000.0, 102000.0, 70000.0])
+    qt = np.array([0.2e-3, 6.6e-3, 17.0e-3, 40.0e-3])
+    args = (T, p) if f is mtf.theta_es else (T, p, qt)
+
+    out = np.empty(T.shape)
+    res = f(*args, es=es, out=out)
+
+    assert res is out
+    np.testing.assert_array_equal(out, f(*args, es=es))
+
+
+def test_out_saturation_partition():
+    p = np.array([20000.0, 80000.0, 102000.0, 70000.0])
+    ps = es(np.array([210.0, 285.0, 300.0, 300.0]))
+    qt = np.array([0.2e-3, 6.6e-3, 17.0e-3, 40.0e-3])
+
+    out = np.empty(p.shape)
+    res = mtf.saturation_partition(p, ps, qt, out=out)
+
+    assert res is out
+    np.testing.assert_array_equal(out, mtf.saturation_partition(p, ps, qt))
+
+
+def test_out_theta_rho():
+    T = np.array([285.0, 300.0])
+    p = np.array([80000.0, 70000.0])
+    qt = np.array([6.6e-3, 40.0e-3])
+    qv = mtf.saturation_partition(p, es(T), qt)
+
+    out = np.empty(T.shape)
+    mtf.theta_rho(T, p, qt, es=es, out=out)
+    theta_rho = mtf.theta_l(T, p, qt, es=es) * (
+        1.0
+        - qt
+        + qv * constants.water_vapor_gas_constant / constants.dry_air_gas_constant
+    )
+
+    np.testing.assert_allclose(out, theta_rho, rtol=1.0e-14)
@@ -1,2 +1,88 @@
+import numpy as np
+import pytest
+
+from moist_thermodynamics import constants
+from moist_thermodynamics import saturation_vapor_pressures as svp
+
+
 def test_dummy():
     pass
+
+
+@pytest.mark.parametrize(
+    "es, es_tab",
+    [
+        (svp.liq_wagner_pruss, svp.liq_wagner_pruss_tab),
+        (svp.ice_wagner_etal, svp.ice_wagner_etal_tab),
+    ],
+)
+def test_tabulated(es, es_tab):
+    T = np.linspace(200.0, 320.0, 10001)
+    np.testing.assert_allclose(es_tab(T), es(T), rtol=1.0e-5)
+
+
+def test_tabulated_outside():
+    T = np.asarray([120.0, 300.0, 360.0])
+    es_tab = svp.liq_wagner_pruss_tab(T)
+
+    assert es_tab[0] == svp.liq_wagner_pruss(T[0])
+    assert es_tab[-1] == svp.liq_wagner_pruss(T[-1])
+
+
+def test_tabulated_nan():
+    T = np.asarray([np.nan, 300.0])
+    es_blocked = svp.make_blocked(svp.liq_wagner_pruss_tab, block=1)
+
+    for es in (svp.liq_wagner_pruss_tab, es_blocked):
+        es_tab = es(T)
+        assert np.isnan(es_tab[0])
+        assert es_tab[1] == pytest.approx(svp.liq_wagner_pruss(T[1]), rel=1.0e-6)
+    assert np.isnan(svp.liq_wagner_pruss_tab(np.nan))
+
+
+def test_tabulated_scalar():
+    T = np.asarray([120.0, 200.5, 273.16, 350.0, 360.0])
+    es_tab = svp.liq_wagner_pruss_tab(T)
+
+    for i, Ti in enumerate(T.tolist()):
+        assert svp.liq_wagner_pruss_tab(Ti) == pytest.approx(es_tab[i], rel=1.0e-14)
+
+
+@pytest.mark.parametrize("T", [np.linspace(200.0, 320.0, 1001), 273.16])
+def test_blocked(T):
+    es_blocked = svp.make_blocked(svp.liq_murphy_koop, block=64)
+    np.testing.assert_array_equal(es_blocked(T), svp.liq_murphy_koop(T))
+
+
+@pytest.mark.parametrize(
+    "es",
+    [
+        svp.liq_wagner_pruss,
+        svp.ice_wagner_etal,
+        svp.liq_murphy_koop,
+        svp.liq_hardy,
+        svp.liq_analytic,
+        svp.ice_analytic,
+        svp.liq_tetens,
+        svp.ice_tetens,
+        svp.liq_wagner_pruss_tab,
+    ],
+)
+def test_float32(es):
+    T = np.linspace(150.0, 340.0, 1001)
+    es32 = es(T.astype(np.float32))
+
+    assert es32.dtype == np.float32
+    np.testing.assert_allclose(es32, es(T), rtol=5.0e-5)
+
+
+def test_analytic_broadcast():
+    T = np.asarray([[250.0], [260.0], [270.0]])
+    es = svp.make_analytic(
+        np.asarray([constants.lvT, constants.lsT]),
+        np.asarray([constants.cl, constants.ci]),
+    )
+
+    np.testing.assert_allclose(es(T)[:, 0], svp.liq_analytic(T[:, 0]), rtol=1.0e-14)
+    np.testing.assert_allclose(es(T)[:, 1], svp.ice_analytic(T[:, 0]), rtol=1.0e-14)
+    np.testing.assert_allclose(es(260.0), es(T)[1], rtol=1.0e-14)